@@ -4,6 +4,11 @@
 MONGO_URI = "mongodb://localhost:27017"
 MONGO_DB = "enrollment_db"
 MONGO_COLLECTION = "students"
+MONGO_TOMBSTONE_COLLECTION = "student_tombstones"  # deleted student_ids, read by the sync
+# aggregate collections maintained on insert/delete
+MONGO_AGG_COURSE_SEMESTER = "agg_course_semester"
+MONGO_AGG_STUDENT = "agg_student_credits"
+MONGO_AGG_INSTRUCTOR_GRADE = "agg_instructor_grades"
 
 # SQL Server (Windows Auth)
 SQL_DRIVER = "ODBC Driver 17 for SQL Server"  # change to 18 if needed
@@ -0,0 +1,4 @@
+# Puts the repo root on sys.path so tests can import services.*
+
+# Connection scripts that need live servers, not pytest tests
+collect_ignore = ["mongo_test.py", "sql_test.py"]
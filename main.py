@@ -6,7 +6,7 @@ from services.csv_loader import (
 )
 from services.mongo_service import (
     insert_denormalized_students,
-    load_mongo_as_flat_records,
+    iter_mongo_flat_rows,
     status as mongo_status,
     delete_all_mongo_data,
     delete_one_student_mongo,
@@ -17,6 +17,12 @@ from services.sql_service import (
     delete_all_sql_data,
     delete_one_student_sql,
 )
+from services.sync_service import run_sync
+from services.analytics_service import (
+    course_semester_enrollments,
+    student_summary,
+    instructor_grade_distribution,
+)
 
 CSV_PATH = "data/enrollments.csv"
 
@@ -25,13 +31,15 @@ def print_menu():
     print("\n=== ADBMS ETL Console ===")
     print("1) Load CSV (2D array → dictionaries)")
     print("2) Insert MongoDB (denormalized)")
-    print("3) Load data from MongoDB (flatten into dictionaries)")
-    print("4) Insert MS SQL Server (normalized) from Mongo-loaded dictionaries")
+    print("3) Load data from MongoDB (flattened server-side into rows)")
+    print("4) Insert MS SQL Server (normalized) from Mongo-loaded rows")
     print("5) View Status (CSV memory + Mongo + SQL)")
     print("6) Delete CSV")
     print("7) Delete MongoDB (ALL data)")
     print("8) Delete MS SQL (ALL data)")
     print("9) Delete SINGLE record")
+    print("10) Continuous sync MongoDB → MS SQL (incremental, Ctrl+C to stop)")
+    print("11) Enrollment analytics (from aggregates)")
     print("0) Exit")
 
 
@@ -48,13 +56,21 @@ def print_single_delete_menu():
     print("0) Back")
 
 
+def print_analytics_menu():
+    print("\n--- Enrollment Analytics ---")
+    print("1) Enrollments per course and semester")
+    print("2) Credit hours and GPA per student")
+    print("3) Grade distribution per instructor")
+    print("0) Back")
+
+
 def main():
     # Central state (memory stage tracking)
     state = {
         "header": None,
         "data_2d": None,
         "csv_dicts": None,     # after CSV -> dict transform
-        "mongo_dicts": None,   # after Mongo -> flatten transform
+        "mongo_rows": None,    # after Mongo -> flatten transform (FLAT_FIELDS tuples)
     }
 
     while True:
@@ -83,18 +99,18 @@ def main():
             inserted = insert_denormalized_students(state["csv_dicts"])
             print(f"MongoDB inserted {inserted} student documents (denormalized).")
 
-        # 3) Load MongoDB (flatten) -> dicts in memory
+        # 3) Load MongoDB (flattened by the server) -> tuples in memory
         elif choice == "3":
-            state["mongo_dicts"] = load_mongo_as_flat_records()
-            print(f"Loaded {len(state['mongo_dicts'])} flattened records from MongoDB.")
+            state["mongo_rows"] = list(iter_mongo_flat_rows())
+            print(f"Loaded {len(state['mongo_rows'])} flattened records from MongoDB.")
 
-        # 4) Insert SQL (normalized) from mongo_dicts
+        # 4) Insert SQL (normalized) from mongo_rows
         elif choice == "4":
-            if not state["mongo_dicts"]:
+            if not state["mongo_rows"]:
                 print("Load MongoDB data first (Option 3).")
                 continue
 
-            info = insert_normalized(state["mongo_dicts"])
+            info = insert_normalized(state["mongo_rows"])
             print("SQL Insert Summary:", info)
 
         # 5) View Status (include CSV memory status)
@@ -137,7 +153,7 @@ def main():
         elif choice == "7":
             deleted = delete_all_mongo_data()
             # Also clear mongo-loaded memory because source is deleted
-            state["mongo_dicts"] = None
+            state["mongo_rows"] = None
             print(f"MongoDB: deleted {deleted} document(s).")
 
         # 8) Delete MSSQL (ALL)
@@ -158,8 +174,8 @@ def main():
 
                 if sub == "1":
                     deleted = delete_one_student_mongo(sid)
-                    # mongo_dicts may now be stale; safest is to clear it
-                    state["mongo_dicts"] = None
+                    # mongo_rows may now be stale; safest is to clear it
+                    state["mongo_rows"] = None
                     print(f"MongoDB: deleted {deleted} document(s) for student_id={sid}")
 
                 elif sub == "2":
@@ -169,6 +185,44 @@ def main():
                 else:
                     print("Invalid option.")
 
+        # 10) Continuous incremental sync Mongo -> SQL
+        elif choice == "10":
+            print("Syncing changed MongoDB students into SQL Server. Press Ctrl+C to stop.")
+            cycles = run_sync()
+            print(f"Sync ran {cycles} polling cycle(s).")
+
+        # 11) Analytics served from the aggregate tables / collections
+        elif choice == "11":
+            while True:
+                print_analytics_menu()
+                sub = input("Select option: ").strip()
+
+                if sub == "0":
+                    break
+
+                source = input("Source (sql/mongo) [sql]: ").strip().lower() or "sql"
+                if source not in ("sql", "mongo"):
+                    print("Invalid source.")
+                    continue
+
+                if sub == "1":
+                    cid = input("Enter course_id (e.g., C1): ").strip()
+                    semester = input("Enter semester (e.g., Spring-2025): ").strip()
+                    count = course_semester_enrollments(cid, semester, source)
+                    print(f"{cid} in {semester}: {count} enrollment(s)")
+
+                elif sub == "2":
+                    sid = input("Enter student_id (e.g., S001): ").strip()
+                    summary = student_summary(sid, source)
+                    print(summary if summary else f"No enrollments for student_id={sid}")
+
+                elif sub == "3":
+                    iid = input("Enter instructor_id (e.g., I1): ").strip()
+                    print(f"Grade distribution for {iid}:", instructor_grade_distribution(iid, source))
+
+                else:
+                    print("Invalid option.")
+
         # 0) Exit
         elif choice == "0":
             print("Exiting application.")
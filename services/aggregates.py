@@ -0,0 +1,75 @@
+"""
+Delta bookkeeping for the enrollment aggregates kept by both databases:
+  - course_semester:  (course_id, semester)  -> enrollment count
+  - student:          student_id             -> enrollments, credit hours, graded credit hours, quality points
+  - instructor_grade: (instructor_id, grade) -> count
+
+Loads and deletes build a delta from the enrollment rows they add (+1) or remove (-1);
+sql_service / mongo_service then apply it to their aggregate tables / collections.
+"""
+
+GRADE_POINTS = {
+    "A": 4.0, "A-": 3.7,
+    "B+": 3.3, "B": 3.0, "B-": 2.7,
+    "C+": 2.3, "C": 2.0,
+    "D": 1.0, "F": 0.0,
+}
+
+
+def new_deltas() -> dict:
+    return {"course_semester": {}, "student": {}, "instructor_grade": {}}
+
+
+def add_enrollment_deltas(deltas: dict, rows, sign: int = 1) -> dict:
+    """
+    Accumulates enrollment rows into deltas.
+    rows: iterable of (student_id, course_id, semester, grade, credit_hours, instructor_id)
+    sign: +1 for rows being added, -1 for rows being removed
+    """
+    course_semester = deltas["course_semester"]
+    student = deltas["student"]
+    instructor_grade = deltas["instructor_grade"]
+
+    for (sid, cid, semester, grade, credit_hours, iid) in rows:
+        credit_hours = credit_hours or 0
+
+        key = (cid, semester)
+        course_semester[key] = course_semester.get(key, 0) + sign
+
+        enrolled, credits, graded, points = student.get(sid, (0, 0, 0, 0.0))
+        enrolled += sign
+        credits += sign * credit_hours
+        # ungraded / unknown grades count toward credit hours but not GPA
+        if grade in GRADE_POINTS:
+            graded += sign * credit_hours
+            points += sign * credit_hours * GRADE_POINTS[grade]
+        student[sid] = (enrolled, credits, graded, points)
+
+        if iid:
+            key = (iid, grade)
+            instructor_grade[key] = instructor_grade.get(key, 0) + sign
+
+    return deltas
+
+
+def enrollment_deltas(rows, sign: int = 1) -> dict:
+    return add_enrollment_deltas(new_deltas(), rows, sign)
+
+
+def changed_course_ids(existing: dict, courses: dict) -> list:
+    """
+    Courses whose credit hours or instructor differ from what is stored.
+    existing: course_id -> (credit_hours, instructor_id)
+    courses:  course_id -> (title, credit_hours, department_id, instructor_id), as from normalize_records
+    Their other students' enrollments must be re-counted, since aggregates use the course's values.
+    """
+    return [
+        cid for cid, (_, credit_hours, _, iid) in courses.items()
+        if cid in existing and existing[cid] != (credit_hours, iid)
+    ]
+
+
+def gpa(graded_credit_hours, quality_points):
+    if not graded_credit_hours:
+        return None
+    return round(float(quality_points) / graded_credit_hours, 2)
@@ -0,0 +1,30 @@
+from services import sql_service, mongo_service
+
+SOURCES = {"sql": sql_service, "mongo": mongo_service}
+
+
+def _source(source: str):
+    if source not in SOURCES:
+        raise ValueError(f"Unknown source: {source} (expected one of {list(SOURCES)})")
+    return SOURCES[source]
+
+
+def course_semester_enrollments(course_id: str, semester: str, source: str = "sql") -> int:
+    """
+    Number of enrollments in a course for a semester.
+    """
+    return _source(source).get_course_semester_enrollments(course_id, semester)
+
+
+def student_summary(student_id: str, source: str = "sql"):
+    """
+    {"enrollments", "credit_hours", "gpa"} for a student, or None if not enrolled.
+    """
+    return _source(source).get_student_stats(student_id)
+
+
+def instructor_grade_distribution(instructor_id: str, source: str = "sql") -> dict:
+    """
+    Grade -> count across all enrollments in an instructor's courses.
+    """
+    return _source(source).get_instructor_grade_distribution(instructor_id)
@@ -1,5 +1,14 @@
 import csv
 
+# Column order of a flat enrollment record (the CSV header); Mongo flat rows use it too
+FLAT_FIELDS = (
+    "student_id", "student_name", "email", "phone",
+    "department_id", "department_name",
+    "course_id", "course_title", "credit_hours",
+    "instructor_id", "instructor_name",
+    "semester", "enroll_date", "grade",
+)
+
 def load_csv_as_2d_array(path: str):
     """
     Returns:
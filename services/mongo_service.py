@@ -1,9 +1,72 @@
-from pymongo import MongoClient
-from config import MONGO_URI, MONGO_DB, MONGO_COLLECTION
+from datetime import datetime, timezone
+
+import bson
+from pymongo import MongoClient, ASCENDING, UpdateOne
+from config import (
+    MONGO_URI, MONGO_DB, MONGO_COLLECTION, MONGO_TOMBSTONE_COLLECTION,
+    MONGO_AGG_COURSE_SEMESTER, MONGO_AGG_STUDENT, MONGO_AGG_INSTRUCTOR_GRADE,
+)
+from services.aggregates import enrollment_deltas, gpa
+from services.csv_loader import FLAT_FIELDS
+
+_client = None
+
+# Documents per insert_many when loading; each chunk gets its own updated_at
+INSERT_CHUNK_SIZE = 1000
+
+# Server-side equivalent of flatten_student_doc, evaluated after $unwind and
+# returned as one array per row (FLAT_FIELDS order), so the client never decodes
+# the nested student / enrollment documents
+FLAT_ROW_EXPR = [
+    {"$ifNull": ["$student_id", ""]},
+    {"$ifNull": ["$name", ""]},
+    {"$ifNull": ["$email", ""]},
+    {"$ifNull": ["$phone", ""]},
+    {"$ifNull": ["$department.department_id", ""]},
+    {"$ifNull": ["$department.name", ""]},
+    {"$ifNull": ["$enrollments.course.course_id", ""]},
+    {"$ifNull": ["$enrollments.course.title", ""]},
+    {"$ifNull": ["$enrollments.course.credit_hours", 0]},
+    {"$ifNull": ["$enrollments.instructor.instructor_id", ""]},
+    {"$ifNull": ["$enrollments.instructor.name", ""]},
+    {"$ifNull": ["$enrollments.semester", ""]},
+    {"$ifNull": ["$enrollments.enroll_date", ""]},
+    {"$ifNull": ["$enrollments.grade", ""]},
+]
+
+def get_client():
+    """
+    Returns a shared MongoClient so long-running loops (the sync daemon)
+    do not open a new connection pool on every call.
+    """
+    global _client
+    if _client is None:
+        _client = MongoClient(MONGO_URI)
+    return _client
+
 
 def get_collection():
-    client = MongoClient(MONGO_URI)
-    return client[MONGO_DB][MONGO_COLLECTION]
+    return get_client()[MONGO_DB][MONGO_COLLECTION]
+
+
+def get_tombstone_collection():
+    return get_client()[MONGO_DB][MONGO_TOMBSTONE_COLLECTION]
+
+
+def get_aggregate_collections():
+    db = get_client()[MONGO_DB]
+    return (
+        db[MONGO_AGG_COURSE_SEMESTER],
+        db[MONGO_AGG_STUDENT],
+        db[MONGO_AGG_INSTRUCTOR_GRADE],
+    )
+
+
+def utc_now() -> datetime:
+    """
+    Current UTC time as a naive datetime, matching what pymongo returns on read.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
 
 def clear_collection():
@@ -18,7 +81,6 @@ def insert_denormalized_students(records: list[dict]) -> int:
       - embedded enrollments list
     """
     col = get_collection()
-    col.delete_many({})  # overwrite for demo cleanliness
 
     grouped = {}
 
@@ -56,9 +118,31 @@ def insert_denormalized_students(records: list[dict]) -> int:
             }
         })
 
+    # students dropped by this load must reach the SQL sync as deletes
+    removed = [
+        d["student_id"] for d in col.find({}, {"_id": 0, "student_id": 1})
+        if d.get("student_id") not in grouped
+    ]
+    col.delete_many({})  # overwrite for demo cleanliness
+    # tombstones are written after the delete, so the sync never sees one for a live document
+    write_tombstones(removed)
+
     docs = list(grouped.values())
-    if docs:
-        col.insert_many(docs)
+    # updated_at is the sync watermark; stamping each chunk right before its insert
+    # keeps the stamp-to-visible delay well under the sync's settle window
+    for i in range(0, len(docs), INSERT_CHUNK_SIZE):
+        chunk = docs[i:i + INSERT_CHUNK_SIZE]
+        now = utc_now()
+        for d in chunk:
+            d["updated_at"] = now
+        col.insert_many(chunk)
+
+    # collection was overwritten, so aggregates are rebuilt from this load's delta
+    clear_aggregates()
+    rows = []
+    for d in docs:
+        rows.extend(aggregate_rows(d))
+    apply_aggregate_deltas(enrollment_deltas(rows))
 
     return len(docs)
 
@@ -70,44 +154,274 @@ def safe_int(x) -> int:
         return 0
 
 
-def load_mongo_as_flat_records() -> list[dict]:
+def load_mongo_as_flat_records(server_side: bool = True) -> list[dict]:
     """
     Loads denormalized MongoDB documents and flattens them into row-like dictionaries,
     so SQL can be inserted in normalized form.
+
+    server_side=True flattens with an $unwind/$project pipeline (see iter_mongo_flat_rows);
+    server_side=False downloads full documents and flattens them in Python.
     """
+    if server_side:
+        return [dict(zip(FLAT_FIELDS, row)) for row in iter_mongo_flat_rows()]
+
     col = get_collection()
     docs = list(col.find({}, {"_id": 0}))
 
     flat_records: list[dict] = []
-
     for d in docs:
-        dept = d.get("department", {})
-        enrollments = d.get("enrollments", [])
-
-        for e in enrollments:
-            course = e.get("course", {})
-            instr = e.get("instructor", {})
-
-            flat_records.append({
-                "student_id": d.get("student_id", ""),
-                "student_name": d.get("name", ""),
-                "email": d.get("email", ""),
-                "phone": d.get("phone", ""),
-                "department_id": dept.get("department_id", ""),
-                "department_name": dept.get("name", ""),
-                "course_id": course.get("course_id", ""),
-                "course_title": course.get("title", ""),
-                "credit_hours": course.get("credit_hours", 0),
-                "instructor_id": instr.get("instructor_id", ""),
-                "instructor_name": instr.get("name", ""),
-                "semester": e.get("semester", ""),
-                "enroll_date": e.get("enroll_date", ""),
-                "grade": e.get("grade", "")
-            })
+        flat_records.extend(flatten_student_doc(d))
 
     return flat_records
 
 
+def flat_rows_pipeline(match: dict = None) -> list[dict]:
+    pipeline = []
+    if match:
+        pipeline.append({"$match": match})
+    pipeline.append({"$unwind": "$enrollments"})
+    pipeline.append({"$project": {"_id": 0, "r": FLAT_ROW_EXPR}})
+    return pipeline
+
+
+def iter_mongo_flat_rows(match: dict = None, batch_size: int = 5000):
+    """
+    Yields one tuple per enrollment, in FLAT_FIELDS order, flattened by the server.
+    match (e.g. {"student_id": {"$in": ids}}) limits the students read.
+    Batches arrive as raw BSON and are decoded with one bson.decode_all call each;
+    every row is a one-key {"r": [...]} document, never a nested student document.
+    """
+    col = get_collection()
+    batches = col.aggregate_raw_batches(flat_rows_pipeline(match), batchSize=batch_size, allowDiskUse=True)
+    for batch in batches:
+        for d in bson.decode_all(batch):
+            yield tuple(d["r"])
+
+
+def flatten_student_doc(d: dict) -> list[dict]:
+    """
+    Flattens one denormalized student document into one dict per enrollment.
+    """
+    dept = d.get("department", {})
+    enrollments = d.get("enrollments", [])
+
+    flat_records: list[dict] = []
+
+    for e in enrollments:
+        course = e.get("course", {})
+        instr = e.get("instructor", {})
+
+        flat_records.append({
+            "student_id": d.get("student_id", ""),
+            "student_name": d.get("name", ""),
+            "email": d.get("email", ""),
+            "phone": d.get("phone", ""),
+            "department_id": dept.get("department_id", ""),
+            "department_name": dept.get("name", ""),
+            "course_id": course.get("course_id", ""),
+            "course_title": course.get("title", ""),
+            "credit_hours": course.get("credit_hours", 0),
+            "instructor_id": instr.get("instructor_id", ""),
+            "instructor_name": instr.get("name", ""),
+            "semester": e.get("semester", ""),
+            "enroll_date": e.get("enroll_date", ""),
+            "grade": e.get("grade", "")
+        })
+
+    return flat_records
+
+
+def aggregate_rows(d: dict) -> list[tuple]:
+    """
+    Enrollment rows (student_id, course_id, semester, grade, credit_hours, instructor_id)
+    of one student document, as consumed by services.aggregates.
+    Rows without a student_id or course_id are skipped, as normalize_records does for SQL.
+    """
+    return [
+        (r["student_id"], r["course_id"], r["semester"], r["grade"], r["credit_hours"], r["instructor_id"])
+        for r in flatten_student_doc(d)
+        if r["student_id"] and r["course_id"]
+    ]
+
+
+_aggregate_indexes_ready = False
+
+def ensure_aggregate_indexes():
+    """
+    Creates the per-instructor lookup index (checked once per process).
+    """
+    global _aggregate_indexes_ready
+    if _aggregate_indexes_ready:
+        return
+    _, _, instr_col = get_aggregate_collections()
+    instr_col.create_index("_id.instructor_id")
+    _aggregate_indexes_ready = True
+
+
+def apply_aggregate_deltas(deltas: dict):
+    """
+    $inc-updates deltas into the aggregate collections. Only positive deltas upsert,
+    so a negative delta for a missing key never creates a negative document.
+    Keys with a negative delta are then deleted by _id if they reached zero.
+    """
+    ensure_aggregate_indexes()
+    course_col, student_col, instr_col = get_aggregate_collections()
+
+    ops = []
+    shrunk = []
+    for (cid, semester), n in deltas["course_semester"].items():
+        if not n:
+            continue
+        key = {"course_id": cid, "semester": semester}
+        ops.append(UpdateOne({"_id": key}, {"$inc": {"enrollment_count": n}}, upsert=n > 0))
+        if n < 0:
+            shrunk.append(key)
+    if ops:
+        course_col.bulk_write(ops, ordered=False)
+    if shrunk:
+        course_col.delete_many({"_id": {"$in": shrunk}, "enrollment_count": {"$lte": 0}})
+
+    ops = []
+    shrunk = []
+    for sid, (enrolled, credits, graded, points) in deltas["student"].items():
+        if not (enrolled or credits or graded or points):
+            continue
+        ops.append(UpdateOne({"_id": sid}, {"$inc": {
+            "enrollment_count": enrolled,
+            "credit_hours": credits,
+            "graded_credit_hours": graded,
+            "quality_points": points,
+        }}, upsert=enrolled > 0))
+        if enrolled < 0:
+            shrunk.append(sid)
+    if ops:
+        student_col.bulk_write(ops, ordered=False)
+    if shrunk:
+        student_col.delete_many({"_id": {"$in": shrunk}, "enrollment_count": {"$lte": 0}})
+
+    ops = []
+    shrunk = []
+    for (iid, grade), n in deltas["instructor_grade"].items():
+        if not n:
+            continue
+        key = {"instructor_id": iid, "grade": grade}
+        ops.append(UpdateOne({"_id": key}, {"$inc": {"grade_count": n}}, upsert=n > 0))
+        if n < 0:
+            shrunk.append(key)
+    if ops:
+        instr_col.bulk_write(ops, ordered=False)
+    if shrunk:
+        instr_col.delete_many({"_id": {"$in": shrunk}, "grade_count": {"$lte": 0}})
+
+
+def clear_aggregates():
+    for c in get_aggregate_collections():
+        c.delete_many({})
+
+
+def get_course_semester_enrollments(course_id: str, semester: str) -> int:
+    course_col, _, _ = get_aggregate_collections()
+    doc = course_col.find_one({"_id": {"course_id": course_id, "semester": semester}})
+    return doc["enrollment_count"] if doc else 0
+
+
+def get_student_stats(student_id: str):
+    _, student_col, _ = get_aggregate_collections()
+    doc = student_col.find_one({"_id": student_id})
+    if not doc:
+        return None
+    return {
+        "enrollments": doc["enrollment_count"],
+        "credit_hours": doc["credit_hours"],
+        "gpa": gpa(doc["graded_credit_hours"], doc["quality_points"]),
+    }
+
+
+def get_instructor_grade_distribution(instructor_id: str) -> dict:
+    _, _, instr_col = get_aggregate_collections()
+    return {
+        doc["_id"]["grade"]: doc["grade_count"]
+        for doc in instr_col.find({"_id.instructor_id": instructor_id})
+    }
+
+
+def ensure_sync_index():
+    """
+    Prepares the students and tombstone collections for watermark polling:
+      - compound index on (updated_at, student_id) in both
+      - student_id index for tombstone upserts / existence checks
+      - stamps documents written before updated_at existed
+    """
+    col = get_collection()
+    col.create_index([("updated_at", ASCENDING), ("student_id", ASCENDING)])
+    col.create_index("student_id")
+    col.update_many({"updated_at": {"$exists": False}}, {"$set": {"updated_at": utc_now()}})
+
+    tombstones = get_tombstone_collection()
+    tombstones.create_index([("updated_at", ASCENDING), ("student_id", ASCENDING)])
+    tombstones.create_index("student_id", unique=True)
+
+
+def write_tombstones(student_ids):
+    """
+    Records deleted student_ids (one tombstone per student, re-stamped on each delete).
+    """
+    tombstones = get_tombstone_collection()
+    ops = []
+    for sid in student_ids:
+        ops.append(UpdateOne({"student_id": sid}, {"$set": {"updated_at": utc_now()}}, upsert=True))
+        if len(ops) >= INSERT_CHUNK_SIZE:
+            tombstones.bulk_write(ops, ordered=False)
+            ops = []
+    if ops:
+        tombstones.bulk_write(ops, ordered=False)
+
+
+def find_changed(col, watermark, cutoff, batch_size: int = 100, projection=None) -> list[dict]:
+    """
+    Returns up to batch_size documents of col (students or tombstones) changed after
+    the watermark and no later than cutoff, ordered by (updated_at, student_id).
+
+    watermark is a (updated_at, student_id) tuple, or None to start from the beginning;
+    cutoff None reads without an upper bound.
+    Writers can make documents with the same updated_at visible in any order, so the
+    student_id tie-breaker is only safe for stamps older than the settle window:
+    callers pass cutoff = now - settle window and never advance past it.
+    """
+    query = {}
+    if cutoff is not None:
+        query["updated_at"] = {"$lte": cutoff}
+    if watermark is not None:
+        wm_ts, wm_sid = watermark
+        query["$or"] = [
+            {"updated_at": {"$gt": wm_ts}},
+            {"updated_at": wm_ts, "student_id": {"$gt": wm_sid}},
+        ]
+
+    cursor = (
+        col.find(query, projection if projection is not None else {"_id": 0})
+        .sort([("updated_at", ASCENDING), ("student_id", ASCENDING)])
+        .limit(batch_size)
+    )
+    return list(cursor)
+
+
+def oldest_pending_change(col, watermark):
+    """
+    updated_at of the first document after the watermark (ignoring the settle cutoff), or None.
+    """
+    docs = find_changed(col, watermark, None, 1, {"_id": 0, "updated_at": 1})
+    return docs[0]["updated_at"] if docs else None
+
+
+def existing_student_ids(student_ids) -> set[str]:
+    col = get_collection()
+    return {
+        d["student_id"]
+        for d in col.find({"student_id": {"$in": list(student_ids)}}, {"_id": 0, "student_id": 1})
+    }
+
+
 def status():
     col = get_collection()
     students = col.count_documents({})
@@ -122,7 +436,10 @@ def delete_all_mongo_data() -> int:
     Returns number of deleted documents.
     """
     col = get_collection()
+    student_ids = [d["student_id"] for d in col.find({}, {"_id": 0, "student_id": 1})]
     res = col.delete_many({})
+    write_tombstones(student_ids)
+    clear_aggregates()
     return res.deleted_count
 
 def delete_one_student_mongo(student_id: str) -> int:
@@ -131,5 +448,9 @@ def delete_one_student_mongo(student_id: str) -> int:
     Returns deleted count (0 or 1).
     """
     col = get_collection()
-    res = col.delete_one({"student_id": student_id})
-    return res.deleted_count
+    doc = col.find_one_and_delete({"student_id": student_id})
+    if doc is None:
+        return 0
+    write_tombstones([student_id])
+    apply_aggregate_deltas(enrollment_deltas(aggregate_rows(doc), -1))
+    return 1
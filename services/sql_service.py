@@ -1,5 +1,46 @@
 import pyodbc
 from config import SQL_DRIVER, SQL_SERVER, SQL_DATABASE, SQL_TRUSTED_CONNECTION
+from services.csv_loader import FLAT_FIELDS
+from services.aggregates import (
+    new_deltas, add_enrollment_deltas, enrollment_deltas, changed_course_ids, gpa,
+)
+
+# Aggregate tables maintained from enrollment deltas (see services/aggregates.py)
+AGGREGATE_TABLES = {
+    "CourseSemesterStats": (
+        "CREATE TABLE CourseSemesterStats("
+        "course_id VARCHAR(50) NOT NULL, semester VARCHAR(50) NOT NULL, "
+        "enrollment_count INT NOT NULL, "
+        "PRIMARY KEY (course_id, semester));"
+    ),
+    "StudentCreditStats": (
+        "CREATE TABLE StudentCreditStats("
+        "student_id VARCHAR(50) NOT NULL PRIMARY KEY, "
+        "enrollment_count INT NOT NULL, credit_hours INT NOT NULL, "
+        "graded_credit_hours INT NOT NULL, quality_points DECIMAL(12, 2) NOT NULL);"
+    ),
+    "InstructorGradeStats": (
+        "CREATE TABLE InstructorGradeStats("
+        "instructor_id VARCHAR(50) NOT NULL, grade VARCHAR(10) NOT NULL, "
+        "grade_count INT NOT NULL, "
+        "PRIMARY KEY (instructor_id, grade));"
+    ),
+}
+
+# Sync bookkeeping, kept in SQL so a watermark commits together with the rows it covers
+SYNC_TABLES = {
+    "SyncWatermarks": (
+        "CREATE TABLE SyncWatermarks("
+        "sync_name VARCHAR(50) NOT NULL PRIMARY KEY, "
+        "updated_at DATETIME2(3) NOT NULL, student_id VARCHAR(50) NOT NULL);"
+    ),
+}
+
+MANAGED_TABLES = {**AGGREGATE_TABLES, **SYNC_TABLES}
+
+CREDIT_HOURS = FLAT_FIELDS.index("credit_hours")
+
+_managed_tables_ready = False
 
 def get_conn():
     return pyodbc.connect(
@@ -13,6 +54,7 @@ def clear_sql_tables():
     """
     Clears data in FK-safe order.
     """
+    ensure_managed_tables()
     conn = get_conn()
     cur = conn.cursor()
     cur.execute("DELETE FROM Enrollments;")
@@ -20,16 +62,151 @@ def clear_sql_tables():
     cur.execute("DELETE FROM Instructors;")
     cur.execute("DELETE FROM Students;")
     cur.execute("DELETE FROM Departments;")
+    # also drops the sync watermarks, so the next sync re-applies everything in Mongo
+    for t in MANAGED_TABLES:
+        cur.execute(f"DELETE FROM {t};")
     conn.commit()
     conn.close()
 
-def insert_normalized(records: list[dict]):
+def ensure_managed_tables():
     """
-    Inserts flattened row-like dictionaries into normalized SQL tables.
+    Creates the aggregate and sync tables if missing, on their own committed connection
+    (SQL Server rolls DDL back with an uncommitted transaction). Checked once per process.
     """
+    global _managed_tables_ready
+    if _managed_tables_ready:
+        return
     conn = get_conn()
     cur = conn.cursor()
+    for t, ddl in MANAGED_TABLES.items():
+        cur.execute(f"IF OBJECT_ID('{t}', 'U') IS NULL {ddl}")
+    conn.commit()
+    conn.close()
+    _managed_tables_ready = True
+
+# SQL Server allows 2100 parameters per statement; IN lists are chunked below that
+IN_CHUNK_SIZE = 1000
+
+def chunked(items: list, size: int = IN_CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def aggregate_rows(cur, student_ids=(), course_ids=()) -> list[tuple]:
+    """
+    Enrollment rows (student_id, course_id, semester, grade, credit_hours, instructor_id)
+    for the given students, plus rows of the given courses belonging to other students.
+    One query per IN chunk.
+    """
+    sql = (
+        "SELECT e.student_id, e.course_id, e.semester, e.grade, c.credit_hours, c.instructor_id "
+        "FROM Enrollments e JOIN Courses c ON c.course_id = e.course_id "
+    )
+    student_ids = set(student_ids)
+    rows = []
+    for chunk in chunked(list(student_ids)):
+        marks = ", ".join("?" * len(chunk))
+        cur.execute(sql + f"WHERE e.student_id IN ({marks});", *chunk)
+        rows.extend(tuple(r) for r in cur.fetchall())
+    for chunk in chunked(list(course_ids)):
+        marks = ", ".join("?" * len(chunk))
+        cur.execute(sql + f"WHERE e.course_id IN ({marks});", *chunk)
+        rows.extend(tuple(r) for r in cur.fetchall() if r[0] not in student_ids)
+    return rows
+
+def existing_courses(cur, course_ids) -> dict:
+    """
+    course_id -> (credit_hours, instructor_id) for the given courses already in SQL.
+    """
+    found = {}
+    for chunk in chunked(list(course_ids)):
+        marks = ", ".join("?" * len(chunk))
+        cur.execute(f"SELECT course_id, credit_hours, instructor_id FROM Courses WHERE course_id IN ({marks});", *chunk)
+        for cid, credit_hours, iid in cur.fetchall():
+            found[cid] = (credit_hours, iid)
+    return found
+
+def apply_aggregate_deltas(cur, deltas: dict):
+    """
+    Adds deltas to the aggregate tables. Runs on the caller's transaction.
+    """
+    ensure_managed_tables()
+    cur.fast_executemany = True
+
+    apply_table_deltas(
+        cur, "CourseSemesterStats", ("course_id", "semester"), ("enrollment_count",),
+        {key: (n,) for key, n in deltas["course_semester"].items()}
+    )
+    apply_table_deltas(
+        cur, "StudentCreditStats", ("student_id",),
+        ("enrollment_count", "credit_hours", "graded_credit_hours", "quality_points"),
+        {
+            (sid,): (enrolled, credits, graded, round(points, 2))
+            for sid, (enrolled, credits, graded, points) in deltas["student"].items()
+        }
+    )
+    apply_table_deltas(
+        cur, "InstructorGradeStats", ("instructor_id", "grade"), ("grade_count",),
+        {key: (n,) for key, n in deltas["instructor_grade"].items()}
+    )
+
+def apply_table_deltas(cur, table: str, key_cols: tuple, value_cols: tuple, deltas: dict):
+    """
+    Applies {key tuple: value delta tuple} to one aggregate table; value_cols[0] is its count.
+      - existing keys are UPDATEd (one executemany)
+      - new keys are INSERTed only when the count delta is positive
+      - keys whose count delta is negative are deleted if they reached zero
+    Existing keys are found with one SELECT per IN chunk of the first key column.
+    """
+    deltas = {key: values for key, values in deltas.items() if any(values)}
+    if not deltas:
+        return
+
+    existing = set()
+    first_ids = list({key[0] for key in deltas})
+    for chunk in chunked(first_ids):
+        marks = ", ".join("?" * len(chunk))
+        cur.execute(f"SELECT {', '.join(key_cols)} FROM {table} WHERE {key_cols[0]} IN ({marks});", *chunk)
+        existing.update(tuple(r) for r in cur.fetchall())
+
+    updates = []
+    inserts = []
+    shrunk = []
+    for key, values in deltas.items():
+        if key in existing:
+            updates.append(values + key)
+            if values[0] < 0:
+                shrunk.append(key)
+        elif values[0] > 0:
+            inserts.append(key + values)
+
+    where = " AND ".join(f"{c}=?" for c in key_cols)
+    if updates:
+        assignments = ", ".join(f"{c} = {c} + ?" for c in value_cols)
+        cur.executemany(f"UPDATE {table} SET {assignments} WHERE {where};", updates)
+    if inserts:
+        cols = key_cols + value_cols
+        marks = ", ".join("?" * len(cols))
+        cur.executemany(f"INSERT INTO {table}({', '.join(cols)}) VALUES ({marks});", inserts)
+    if shrunk:
+        cur.executemany(f"DELETE FROM {table} WHERE {where} AND {value_cols[0]} <= 0;", shrunk)
+
+def clean_row(values) -> tuple:
+    """
+    Cleans one FLAT_FIELDS-ordered record: text fields are str()-ed and stripped,
+    credit_hours becomes an int.
+    """
+    row = [str(v).strip() for v in values]
+    row[CREDIT_HOURS] = safe_int(row[CREDIT_HOURS])
+    return tuple(row)
 
+def normalize_records(records):
+    """
+    Splits flat enrollment records into per-table rows:
+    departments, students, instructors, courses (dicts keyed by id) and enrollments (list).
+
+    records may be any iterable (e.g. the iter_mongo_flat_rows stream) of
+    FLAT_FIELDS-ordered tuples or flat record dicts; both are cleaned with clean_row.
+    """
     departments = {}
     students = {}
     instructors = {}
@@ -37,49 +214,43 @@ def insert_normalized(records: list[dict]):
     enrollments = []
 
     for r in records:
-        dept_id = str(r.get("department_id", "")).strip()
-        dept_name = str(r.get("department_name", "")).strip()
+        if isinstance(r, dict):
+            r = [r.get(f, "") for f in FLAT_FIELDS]
+        (sid, student_name, email, phone, dept_id, dept_name,
+         cid, course_title, credit_hours, iid, instructor_name,
+         semester, enroll_date, grade) = clean_row(r)
+
         if dept_id:
             departments[dept_id] = dept_name
 
-        sid = str(r.get("student_id", "")).strip()
         if sid:
-            students[sid] = (
-                str(r.get("student_name", "")).strip(),
-                str(r.get("email", "")).strip(),
-                str(r.get("phone", "")).strip(),
-                dept_id
-            )
+            students[sid] = (student_name, email, phone, dept_id)
 
-        iid = str(r.get("instructor_id", "")).strip()
         if iid:
-            instructors[iid] = (
-                str(r.get("instructor_name", "")).strip(),
-                dept_id
-            )
+            instructors[iid] = (instructor_name, dept_id)
 
-        cid = str(r.get("course_id", "")).strip()
         if cid:
-            courses[cid] = (
-                str(r.get("course_title", "")).strip(),
-                safe_int(r.get("credit_hours", 0)),
-                dept_id,
-                iid
-            )
+            courses[cid] = (course_title, credit_hours, dept_id, iid)
 
-        # each record is one enrollment row
+        # each record is one enrollment row (enroll_date is a YYYY-MM-DD string)
         if sid and cid:
-            enrollments.append((
-                sid,
-                cid,
-                str(r.get("semester", "")).strip(),
-                str(r.get("enroll_date", "")).strip(),  # date string YYYY-MM-DD
-                str(r.get("grade", "")).strip()
-            ))
+            enrollments.append((sid, cid, semester, enroll_date, grade))
+
+    return departments, students, instructors, courses, enrollments
+
+def insert_normalized(records):
+    """
+    Inserts flat enrollment records (dicts or FLAT_FIELDS tuples, see normalize_records)
+    into normalized SQL tables.
+    """
+    departments, students, instructors, courses, enrollments = normalize_records(records)
 
     # Optional: clear tables before inserting (demo-friendly)
     clear_sql_tables()
 
+    conn = get_conn()
+    cur = conn.cursor()
+
     # Insert Departments
     for dept_id, dept_name in departments.items():
         cur.execute(
@@ -115,6 +286,12 @@ def insert_normalized(records: list[dict]):
             sid, cid, semester, enroll_date, grade
         )
 
+    # Aggregates (tables were cleared above, so the delta is the full load)
+    apply_aggregate_deltas(cur, enrollment_deltas(
+        (sid, cid, semester, grade, courses[cid][1], courses[cid][3])
+        for (sid, cid, semester, _, grade) in enrollments
+    ))
+
     conn.commit()
     conn.close()
 
@@ -126,6 +303,125 @@ def insert_normalized(records: list[dict]):
         "enrollments": len(enrollments),
     }
 
+def replace_students_normalized(records, student_ids: list[str], sync_name: str = None, watermark=None):
+    """
+    Incremental counterpart of insert_normalized: rewrites only the given students.
+      - Departments / Instructors / Courses / Students are upserted
+      - the students' Enrollments are deleted and re-inserted from records
+      - students in student_ids with no records are removed
+      - aggregates get the difference between the affected rows before and after
+      - if sync_name is given, its watermark is saved
+    Runs in a single transaction. Returns per-table row counts touched.
+    """
+    departments, students, instructors, courses, enrollments = normalize_records(records)
+
+    ensure_managed_tables()
+    conn = get_conn()
+    cur = conn.cursor()
+
+    # A course whose credit hours / instructor change shifts other students' aggregates too
+    changed_courses = changed_course_ids(existing_courses(cur, courses), courses)
+
+    affected = set(student_ids)
+    deltas = add_enrollment_deltas(new_deltas(), aggregate_rows(cur, affected, changed_courses), -1)
+
+    for sid in student_ids:
+        cur.execute("DELETE FROM Enrollments WHERE student_id=?;", sid)
+
+    for dept_id, dept_name in departments.items():
+        cur.execute("UPDATE Departments SET department_name=? WHERE department_id=?;", dept_name, dept_id)
+        if cur.rowcount == 0:
+            cur.execute(
+                "INSERT INTO Departments(department_id, department_name) VALUES (?, ?);",
+                dept_id, dept_name
+            )
+
+    for sid, (name, email, phone, dept_id) in students.items():
+        cur.execute(
+            "UPDATE Students SET student_name=?, email=?, phone=?, department_id=? WHERE student_id=?;",
+            name, email, phone, dept_id, sid
+        )
+        if cur.rowcount == 0:
+            cur.execute(
+                "INSERT INTO Students(student_id, student_name, email, phone, department_id) VALUES (?, ?, ?, ?, ?);",
+                sid, name, email, phone, dept_id
+            )
+
+    for iid, (iname, dept_id) in instructors.items():
+        cur.execute(
+            "UPDATE Instructors SET instructor_name=?, department_id=? WHERE instructor_id=?;",
+            iname, dept_id, iid
+        )
+        if cur.rowcount == 0:
+            cur.execute(
+                "INSERT INTO Instructors(instructor_id, instructor_name, department_id) VALUES (?, ?, ?);",
+                iid, iname, dept_id
+            )
+
+    for cid, (title, credit_hours, dept_id, iid) in courses.items():
+        cur.execute(
+            "UPDATE Courses SET course_title=?, credit_hours=?, department_id=?, instructor_id=? WHERE course_id=?;",
+            title, credit_hours, dept_id, iid, cid
+        )
+        if cur.rowcount == 0:
+            cur.execute(
+                "INSERT INTO Courses(course_id, course_title, credit_hours, department_id, instructor_id) VALUES (?, ?, ?, ?, ?);",
+                cid, title, credit_hours, dept_id, iid
+            )
+
+    for (sid, cid, semester, enroll_date, grade) in enrollments:
+        cur.execute(
+            "INSERT INTO Enrollments(student_id, course_id, semester, enroll_date, grade) VALUES (?, ?, ?, ?, ?);",
+            sid, cid, semester, enroll_date, grade
+        )
+
+    # students whose Mongo document no longer has any enrollment rows
+    removed = [sid for sid in student_ids if sid not in students]
+    for sid in removed:
+        cur.execute("DELETE FROM Students WHERE student_id=?;", sid)
+
+    add_enrollment_deltas(deltas, aggregate_rows(cur, affected, changed_courses), 1)
+    apply_aggregate_deltas(cur, deltas)
+
+    if sync_name:
+        save_sync_watermark(cur, sync_name, watermark)
+
+    conn.commit()
+    conn.close()
+
+    return {
+        "students": len(students),
+        "enrollments": len(enrollments),
+        "removed_students": len(removed),
+    }
+
+def load_sync_watermark(name: str):
+    """
+    Returns the saved (updated_at, student_id) watermark for a sync, or None.
+    """
+    ensure_managed_tables()
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT updated_at, student_id FROM SyncWatermarks WHERE sync_name=?;", name)
+    row = cur.fetchone()
+    conn.close()
+    return (row[0], row[1]) if row else None
+
+def save_sync_watermark(cur, name: str, watermark):
+    """
+    Saves a watermark on the caller's transaction.
+    """
+    updated_at, student_id = watermark
+    cur.execute(
+        "UPDATE SyncWatermarks SET updated_at=?, student_id=? WHERE sync_name=?;",
+        updated_at, student_id, name
+    )
+    if cur.rowcount == 0:
+        cur.execute(
+            "INSERT INTO SyncWatermarks(sync_name, updated_at, student_id) VALUES (?, ?, ?);",
+            name, updated_at, student_id
+        )
+
 def safe_int(x) -> int:
     try:
         return int(str(x).strip())
@@ -152,9 +448,66 @@ def delete_one_student_sql(student_id: str):
     """
     Deletes a student and their enrollments (FK-safe).
     """
+    ensure_managed_tables()
     conn = get_conn()
     cur = conn.cursor()
+    removed_rows = aggregate_rows(cur, [student_id])
     cur.execute("DELETE FROM Enrollments WHERE student_id=?;", student_id)
     cur.execute("DELETE FROM Students WHERE student_id=?;", student_id)
+    apply_aggregate_deltas(cur, enrollment_deltas(removed_rows, -1))
+    # SQL no longer matches Mongo for this student: make the next sync start over
+    cur.execute("DELETE FROM SyncWatermarks;")
     conn.commit()
     conn.close()
+
+def get_course_semester_enrollments(course_id: str, semester: str) -> int:
+    """
+    Enrollment count for one course in one semester (single-row aggregate lookup).
+    """
+    ensure_managed_tables()
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT enrollment_count FROM CourseSemesterStats WHERE course_id=? AND semester=?;",
+        course_id, semester
+    )
+    row = cur.fetchone()
+    conn.close()
+    return row[0] if row else 0
+
+def get_student_stats(student_id: str):
+    """
+    Enrollments, credit hours and GPA for one student, or None if not enrolled.
+    """
+    ensure_managed_tables()
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT enrollment_count, credit_hours, graded_credit_hours, quality_points "
+        "FROM StudentCreditStats WHERE student_id=?;",
+        student_id
+    )
+    row = cur.fetchone()
+    conn.close()
+    if not row:
+        return None
+    return {
+        "enrollments": row[0],
+        "credit_hours": row[1],
+        "gpa": gpa(row[2], row[3]),
+    }
+
+def get_instructor_grade_distribution(instructor_id: str) -> dict:
+    """
+    Grade -> count for one instructor (at most one row per grade).
+    """
+    ensure_managed_tables()
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT grade, grade_count FROM InstructorGradeStats WHERE instructor_id=?;",
+        instructor_id
+    )
+    dist = {grade: count for grade, count in cur.fetchall()}
+    conn.close()
+    return dist
@@ -0,0 +1,130 @@
+import time
+from datetime import timedelta
+from typing import Optional
+
+from services.mongo_service import (
+    ensure_sync_index,
+    existing_student_ids,
+    find_changed,
+    get_collection,
+    get_tombstone_collection,
+    iter_mongo_flat_rows,
+    oldest_pending_change,
+    utc_now,
+)
+from services.sql_service import load_sync_watermark, replace_students_normalized
+
+SYNC_NAME = "mongo_to_sql"
+DELETES_SYNC_NAME = "mongo_to_sql:deletes"
+
+# Changes younger than this are left for the next cycle, so every document stamped
+# with the same updated_at is visible before the watermark moves past it
+SETTLE_SECONDS = 5.0
+
+
+def sync_once(batch_size: int = 100, settle_seconds: float = SETTLE_SECONDS) -> dict:
+    """
+    Runs one polling cycle of the Mongo -> SQL incremental sync:
+      - applies every student document changed since the saved watermark, batch by batch
+      - removes SQL students whose tombstone is newer than the deletes watermark
+    Only changes older than settle_seconds are read.
+    Returns stats for the cycle (documents, enrollments, deletes, lag, throughput).
+    """
+    started = time.perf_counter()
+    cutoff = utc_now() - timedelta(seconds=settle_seconds)
+
+    col = get_collection()
+    watermark = load_sync_watermark(SYNC_NAME)
+    docs_applied = 0
+    enrollments_applied = 0
+
+    while True:
+        docs = find_changed(col, watermark, cutoff, batch_size, {"_id": 0, "student_id": 1, "updated_at": 1})
+        if not docs:
+            break
+
+        # the batch's rows come back already flat from the server
+        student_ids = [d["student_id"] for d in docs]
+        records = list(iter_mongo_flat_rows({"student_id": {"$in": student_ids}}))
+        last = docs[-1]
+        watermark = (last["updated_at"], last["student_id"])
+        # rows and watermark commit together
+        replace_students_normalized(records, student_ids, SYNC_NAME, watermark)
+
+        docs_applied += len(docs)
+        enrollments_applied += len(records)
+
+        if len(docs) < batch_size:
+            break
+
+    tombstones = get_tombstone_collection()
+    deletes_watermark = load_sync_watermark(DELETES_SYNC_NAME)
+    students_deleted = 0
+
+    while True:
+        stones = find_changed(tombstones, deletes_watermark, cutoff, batch_size)
+        if not stones:
+            break
+
+        # a student re-inserted after its delete is handled by the document stream
+        tombstoned = [t["student_id"] for t in stones]
+        live = existing_student_ids(tombstoned)
+        gone = [sid for sid in tombstoned if sid not in live]
+        last = stones[-1]
+        deletes_watermark = (last["updated_at"], last["student_id"])
+        replace_students_normalized([], gone, DELETES_SYNC_NAME, deletes_watermark)
+
+        students_deleted += len(gone)
+
+        if len(stones) < batch_size:
+            break
+
+    # lag = age of the oldest change not yet in SQL (0 when fully caught up)
+    pending = [
+        ts for ts in (
+            oldest_pending_change(col, watermark),
+            oldest_pending_change(tombstones, deletes_watermark),
+        ) if ts is not None
+    ]
+    lag_seconds = (utc_now() - min(pending)).total_seconds() if pending else 0.0
+
+    elapsed = time.perf_counter() - started
+    return {
+        "docs_applied": docs_applied,
+        "enrollments_applied": enrollments_applied,
+        "students_deleted": students_deleted,
+        "lag_seconds": round(lag_seconds, 3),
+        "docs_per_sec": round(docs_applied / elapsed, 1) if elapsed > 0 else 0.0,
+        "elapsed_seconds": round(elapsed, 3),
+    }
+
+
+def run_sync(poll_interval: float = 2.0, batch_size: int = 100, max_cycles: Optional[int] = None):
+    """
+    Long-running sync mode: polls MongoDB every poll_interval seconds and keeps the
+    normalized SQL tables in step with it. Stops on Ctrl+C (or after max_cycles).
+    A failed cycle is reported and retried on the next poll; watermarks only move
+    with committed batches, so a retry re-applies nothing twice.
+    """
+    index_ready = False
+    cycles = 0
+    try:
+        while max_cycles is None or cycles < max_cycles:
+            try:
+                if not index_ready:
+                    ensure_sync_index()
+                    index_ready = True
+                print("Sync:", sync_once(batch_size))
+            except Exception as e:
+                print(f"Sync cycle failed, retrying in {poll_interval}s: {e}")
+            cycles += 1
+            if max_cycles is None or cycles < max_cycles:
+                time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        print("Sync stopped.")
+
+    return cycles
+
+
+if __name__ == "__main__":
+    run_sync()
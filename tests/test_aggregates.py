@@ -0,0 +1,40 @@
+from services.aggregates import changed_course_ids, enrollment_deltas, gpa
+
+# (student_id, course_id, semester, grade, credit_hours, instructor_id)
+LOAD = [
+    ("S001", "C1", "Spring-2025", "A", 3, "I1"),
+    ("S001", "C2", "Spring-2025", "B+", 3, "I1"),
+    ("S002", "C1", "Spring-2025", "A-", 3, "I1"),
+    ("S002", "C9", "Fall-2025", "", 3, "I5"),
+]
+
+
+def test_load_counts():
+    deltas = enrollment_deltas(LOAD)
+
+    assert deltas["course_semester"][("C1", "Spring-2025")] == 2
+    assert deltas["course_semester"][("C9", "Fall-2025")] == 1
+    assert deltas["instructor_grade"][("I1", "A")] == 1
+    assert deltas["student"]["S001"] == (2, 6, 6, 3 * 4.0 + 3 * 3.3)
+
+
+def test_ungraded_counts_credit_hours_but_not_gpa():
+    enrolled, credits, graded, points = enrollment_deltas(LOAD)["student"]["S002"]
+
+    assert (enrolled, credits, graded) == (2, 6, 3)
+    assert gpa(graded, points) == 3.7
+
+
+def test_gpa_without_graded_hours():
+    assert gpa(0, 0.0) is None
+
+
+def test_changed_course_ids():
+    existing = {"C1": (3, "I1"), "C2": (3, "I1")}
+    courses = {
+        "C1": ("Database Systems", 4, "D1", "I1"),   # credit hours changed
+        "C2": ("Data Structures", 3, "D1", "I1"),    # unchanged
+        "C3": ("Software Design", 3, "D2", "I2"),    # new course
+    }
+
+    assert changed_course_ids(existing, courses) == ["C1"]
@@ -0,0 +1,163 @@
+import pytest
+
+bson = pytest.importorskip("bson")
+
+from services import mongo_service  # noqa: E402
+from services.aggregates import enrollment_deltas  # noqa: E402
+
+STUDENTS = [
+    {
+        "student_id": "S001", "name": "Ali Khan", "email": "ali1@example.com", "phone": "0300",
+        "department": {"department_id": "D1", "name": "Computer Science"},
+        "enrollments": [
+            {"semester": "Spring-2025", "enroll_date": "2025-01-10", "grade": "A",
+             "course": {"course_id": "C1", "title": "Database Systems", "credit_hours": 3},
+             "instructor": {"instructor_id": "I1", "name": "Dr. Khan"}},
+            {"semester": "Spring-2025", "enroll_date": "2025-01-11", "grade": "B+",
+             "course": {"course_id": "C2", "title": "Data Structures", "credit_hours": 3},
+             "instructor": {"instructor_id": "I1", "name": "Dr. Khan"}},
+            # no course_id: skipped, as normalize_records does for SQL
+            {"semester": "Spring-2025", "enroll_date": "2025-01-12", "grade": "A",
+             "course": {"title": "Orphan", "credit_hours": 3},
+             "instructor": {"instructor_id": "I1", "name": "Dr. Khan"}},
+        ],
+    },
+    {
+        "student_id": "S002", "name": "Sana Raza", "email": "sana2@example.com", "phone": "0301",
+        "department": {"department_id": "D5", "name": "Mathematics"},
+        "enrollments": [
+            {"semester": "Fall-2025", "enroll_date": "2025-08-01", "grade": "",
+             "course": {"course_id": "C9", "title": "Linear Algebra", "credit_hours": 3},
+             "instructor": {"instructor_id": "I5", "name": "Dr. Ayesha"}},
+        ],
+    },
+]
+
+
+def _key(_id):
+    return tuple(_id.items()) if isinstance(_id, dict) else _id
+
+
+class FakeCollection:
+    """
+    The slice of a pymongo collection used by the aggregate code:
+    $inc UpdateOne bulk writes, _id lookups and {"_id": {"$in"}, field: {"$lte"}} deletes.
+    """
+
+    def __init__(self):
+        self.docs = {}
+
+    def bulk_write(self, ops, ordered=True):
+        for op in ops:
+            _id = op._filter["_id"]
+            doc = self.docs.get(_key(_id))
+            if doc is None:
+                if not op._upsert:
+                    continue
+                doc = self.docs[_key(_id)] = {"_id": _id}
+            for field, n in op._doc["$inc"].items():
+                doc[field] = doc.get(field, 0) + n
+
+    def delete_many(self, query):
+        ids = [_key(i) for i in query["_id"]["$in"]]
+        ((field, cond),) = [(f, c) for f, c in query.items() if f != "_id"]
+        for k in ids:
+            if k in self.docs and self.docs[k][field] <= cond["$lte"]:
+                del self.docs[k]
+
+    def create_index(self, keys):
+        pass
+
+    def find_one(self, query):
+        return self.docs.get(_key(query["_id"]))
+
+    def find(self, query):
+        ((path, value),) = query.items()
+        field = path.split(".", 1)[1]
+        return [d for d in self.docs.values() if d["_id"][field] == value]
+
+
+@pytest.fixture
+def aggregates(monkeypatch):
+    cols = (FakeCollection(), FakeCollection(), FakeCollection())
+    monkeypatch.setattr(mongo_service, "get_aggregate_collections", lambda: cols)
+    return cols
+
+
+def load_deltas():
+    rows = []
+    for d in STUDENTS:
+        rows.extend(mongo_service.aggregate_rows(d))
+    return enrollment_deltas(rows)
+
+
+def test_load_builds_aggregates(aggregates):
+    mongo_service.apply_aggregate_deltas(load_deltas())
+
+    assert mongo_service.get_course_semester_enrollments("C1", "Spring-2025") == 1
+    assert mongo_service.get_student_stats("S001") == {"enrollments": 2, "credit_hours": 6, "gpa": 3.65}
+    assert mongo_service.get_student_stats("S002") == {"enrollments": 1, "credit_hours": 3, "gpa": None}
+    assert mongo_service.get_instructor_grade_distribution("I1") == {"A": 1, "B+": 1}
+
+
+def test_load_then_delete_returns_to_zero(aggregates):
+    mongo_service.apply_aggregate_deltas(load_deltas())
+    for d in STUDENTS:
+        mongo_service.apply_aggregate_deltas(enrollment_deltas(mongo_service.aggregate_rows(d), -1))
+
+    assert [c.docs for c in aggregates] == [{}, {}, {}]
+
+
+def test_negative_delta_for_missing_key_is_not_upserted(aggregates):
+    mongo_service.apply_aggregate_deltas({
+        "course_semester": {("C7", "Fall-2025"): -1},
+        "student": {"S404": (-1, -3, -3, -9.0)},
+        "instructor_grade": {("I4", "B"): -1},
+    })
+
+    assert [c.docs for c in aggregates] == [{}, {}, {}]
+
+
+def test_flat_rows_pipeline():
+    pipeline = mongo_service.flat_rows_pipeline({"student_id": {"$in": ["S001"]}})
+
+    assert pipeline[0] == {"$match": {"student_id": {"$in": ["S001"]}}}
+    assert pipeline[1] == {"$unwind": "$enrollments"}
+    assert len(pipeline[2]["$project"]["r"]) == len(mongo_service.FLAT_FIELDS)
+    assert mongo_service.flat_rows_pipeline()[0] == {"$unwind": "$enrollments"}
+
+
+class RawBatchCollection:
+    """
+    Answers aggregate_raw_batches the way the server does for flat_rows_pipeline:
+    concatenated BSON {"r": [...]} documents, batch_size rows per batch.
+    """
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.pipeline = None
+
+    def aggregate_raw_batches(self, pipeline, batchSize, **kwargs):
+        self.pipeline = pipeline
+        rows = []
+        for d in self.docs:
+            for r in mongo_service.flatten_student_doc(d):
+                rows.append({"r": [r[f] for f in mongo_service.FLAT_FIELDS]})
+        return [
+            b"".join(bson.encode(row) for row in rows[i:i + batchSize])
+            for i in range(0, len(rows), batchSize)
+        ]
+
+
+def test_iter_mongo_flat_rows_decodes_raw_batches(monkeypatch):
+    col = RawBatchCollection(STUDENTS)
+    monkeypatch.setattr(mongo_service, "get_collection", lambda: col)
+
+    rows = list(mongo_service.iter_mongo_flat_rows({"student_id": "S001"}, batch_size=2))
+
+    expected = [
+        tuple(r[f] for f in mongo_service.FLAT_FIELDS)
+        for d in STUDENTS for r in mongo_service.flatten_student_doc(d)
+    ]
+    assert rows == expected
+    assert col.pipeline == mongo_service.flat_rows_pipeline({"student_id": "S001"})
@@ -0,0 +1,166 @@
+import sqlite3
+
+import pytest
+
+try:
+    from services import sql_service
+except ImportError as e:  # pyodbc missing, or installed without the unixODBC library
+    pytest.skip(f"sql_service not importable: {e}", allow_module_level=True)
+
+BASE_TABLES = [
+    "CREATE TABLE Departments(department_id VARCHAR(50) PRIMARY KEY, department_name VARCHAR(100));",
+    "CREATE TABLE Students(student_id VARCHAR(50) PRIMARY KEY, student_name VARCHAR(100), "
+    "email VARCHAR(100), phone VARCHAR(50), department_id VARCHAR(50));",
+    "CREATE TABLE Instructors(instructor_id VARCHAR(50) PRIMARY KEY, instructor_name VARCHAR(100), "
+    "department_id VARCHAR(50));",
+    "CREATE TABLE Courses(course_id VARCHAR(50) PRIMARY KEY, course_title VARCHAR(100), credit_hours INT, "
+    "department_id VARCHAR(50), instructor_id VARCHAR(50));",
+    "CREATE TABLE Enrollments(student_id VARCHAR(50), course_id VARCHAR(50), semester VARCHAR(50), "
+    "enroll_date VARCHAR(20), grade VARCHAR(10));",
+]
+
+# FLAT_FIELDS order
+ROWS = [
+    ("S001", "Ali Khan", "ali1@example.com", "0300", "D1", "Computer Science",
+     "C1", "Database Systems", 3, "I1", "Dr. Khan", "Spring-2025", "2025-01-10", "A"),
+    ("S001", "Ali Khan", "ali1@example.com", "0300", "D1", "Computer Science",
+     "C2", "Data Structures", 3, "I1", "Dr. Khan", "Spring-2025", "2025-01-11", "B+"),
+    ("S002", "Sana Raza", "sana2@example.com", "0301", "D5", "Mathematics",
+     "C1", "Database Systems", 3, "I1", "Dr. Khan", "Spring-2025", "2025-01-12", "A-"),
+    ("S002", "Sana Raza", "sana2@example.com", "0301", "D5", "Mathematics",
+     "C9", "Linear Algebra", 3, "I5", "Dr. Ayesha", "Fall-2025", "2025-08-01", ""),
+]
+
+
+class FakeCursor:
+    """
+    pyodbc-style cursor (positional parameters, fast_executemany) over sqlite3.
+    """
+
+    def __init__(self, conn):
+        self._cur = conn.cursor()
+        self.fast_executemany = False
+
+    def execute(self, sql, *params):
+        self._cur.execute(sql, params)
+        return self
+
+    def executemany(self, sql, seq):
+        self._cur.executemany(sql, list(seq))
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+
+class FakeConn:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return FakeCursor(self._conn)
+
+    def commit(self):
+        self._conn.commit()
+
+    def close(self):
+        pass  # the same sqlite connection is reused by every get_conn()
+
+
+@pytest.fixture
+def db(monkeypatch):
+    conn = sqlite3.connect(":memory:")
+    for ddl in BASE_TABLES + list(sql_service.MANAGED_TABLES.values()):
+        conn.execute(ddl)
+    monkeypatch.setattr(sql_service, "get_conn", lambda: FakeConn(conn))
+    monkeypatch.setattr(sql_service, "_managed_tables_ready", True)
+    return conn
+
+
+def aggregates(conn) -> dict:
+    return {
+        t: sorted(conn.execute(f"SELECT * FROM {t}").fetchall())
+        for t in sql_service.AGGREGATE_TABLES
+    }
+
+
+def with_credit_hours(rows, course_id, credit_hours):
+    return [r[:8] + (credit_hours,) + r[9:] if r[6] == course_id else r for r in rows]
+
+
+def test_insert_normalized_builds_aggregates(db):
+    sql_service.insert_normalized(ROWS)
+
+    assert sql_service.get_course_semester_enrollments("C1", "Spring-2025") == 2
+    assert sql_service.get_student_stats("S002") == {"enrollments": 2, "credit_hours": 6, "gpa": 3.7}
+    assert sql_service.get_instructor_grade_distribution("I1") == {"A": 1, "B+": 1, "A-": 1}
+
+
+def test_load_then_delete_returns_to_zero(db):
+    sql_service.insert_normalized(ROWS)
+    sql_service.delete_one_student_sql("S001")
+    sql_service.delete_one_student_sql("S002")
+
+    assert aggregates(db) == {t: [] for t in sql_service.AGGREGATE_TABLES}
+
+
+def test_negative_delta_for_missing_key_is_not_inserted(db):
+    deltas = {
+        "course_semester": {("C7", "Fall-2025"): -1},
+        "student": {"S404": (-1, -3, -3, -9.0)},
+        "instructor_grade": {("I4", "B"): -1},
+    }
+    sql_service.apply_aggregate_deltas(sql_service.get_conn().cursor(), deltas)
+
+    assert aggregates(db) == {t: [] for t in sql_service.AGGREGATE_TABLES}
+
+
+def test_replace_students_recounts_changed_course(db, monkeypatch):
+    sql_service.insert_normalized(ROWS)
+
+    # S001 re-synced while C1 moves from 3 to 4 credit hours; S002 is also enrolled in C1
+    changed = with_credit_hours(ROWS, "C1", 4)
+    sql_service.replace_students_normalized([r for r in changed if r[0] == "S001"], ["S001"])
+
+    reloaded = sqlite3.connect(":memory:")
+    for ddl in BASE_TABLES + list(sql_service.MANAGED_TABLES.values()):
+        reloaded.execute(ddl)
+    monkeypatch.setattr(sql_service, "get_conn", lambda: FakeConn(reloaded))
+    sql_service.insert_normalized(changed)
+
+    assert aggregates(db) == aggregates(reloaded)
+    assert aggregates(db)["StudentCreditStats"][1][2] == 7   # S002: 4 + 3 credit hours
+
+
+def test_sql_resets_reset_the_sync_watermarks(db):
+    watermark = ("2025-01-15 10:00:00.000", "S001")
+    sql_service.insert_normalized(ROWS)
+
+    sql_service.replace_students_normalized(ROWS[:2], ["S001"], "mongo_to_sql", watermark)
+    assert sql_service.load_sync_watermark("mongo_to_sql") == watermark
+    sql_service.delete_one_student_sql("S002")
+    assert sql_service.load_sync_watermark("mongo_to_sql") is None
+
+    sql_service.replace_students_normalized(ROWS[:2], ["S001"], "mongo_to_sql", watermark)
+    sql_service.clear_sql_tables()
+    assert sql_service.load_sync_watermark("mongo_to_sql") is None
+
+
+def test_normalize_records_cleans_tuples_and_dicts_alike():
+    # a document edited outside the app: padded ids, numeric phone, string credit hours
+    messy = (" S003 ", "Hina Malik ", "hina3@example.com", 3001234567, "D3 ", "Information Technology",
+             " C5", "Networks", "3", "I3 ", "Dr. Ahmed", "Fall-2025", "2025-09-01", "B ")
+    as_dict = dict(zip(sql_service.FLAT_FIELDS, messy))
+
+    normalized = sql_service.normalize_records([messy])
+    assert normalized == sql_service.normalize_records([as_dict])
+    departments, students, instructors, courses, enrollments = normalized
+    assert students == {"S003": ("Hina Malik", "hina3@example.com", "3001234567", "D3")}
+    assert courses == {"C5": ("Networks", 3, "D3", "I3")}
+    assert enrollments == [("S003", "C5", "Fall-2025", "2025-09-01", "B")]
@@ -0,0 +1,25 @@
+import pytest
+
+try:
+    from services import sync_service
+except ImportError as e:  # pyodbc missing, or installed without the unixODBC library
+    pytest.skip(f"sync_service not importable: {e}", allow_module_level=True)
+
+
+def test_run_sync_survives_a_failed_cycle(monkeypatch):
+    calls = []
+    sleeps = []
+
+    def sync_once(batch_size):
+        calls.append(batch_size)
+        if len(calls) == 1:
+            raise ConnectionError("SQL Server went away")
+        return {"docs_applied": 0}
+
+    monkeypatch.setattr(sync_service, "ensure_sync_index", lambda: None)
+    monkeypatch.setattr(sync_service, "sync_once", sync_once)
+    monkeypatch.setattr(sync_service.time, "sleep", sleeps.append)
+
+    assert sync_service.run_sync(poll_interval=1.5, max_cycles=3) == 3
+    assert len(calls) == 3
+    assert sleeps == [1.5, 1.5]   # no sleep after the last cycle